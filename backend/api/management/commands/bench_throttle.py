@@ -0,0 +1,55 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+
+from api.throttling import IPActionThrottle, UserActionThrottle
+
+
+class FakeView:
+    action = 'download_shopping_cart'
+    throttle_scopes = {'download_shopping_cart': 'export'}
+
+
+class FakeUser:
+    is_authenticated = True
+
+    def __init__(self, pk):
+        self.pk = pk
+
+
+class Command(BaseCommand):
+    '''Замер накладных расходов ограничения частоты на один запрос.
+
+       Прогоняет проверку UserActionThrottle и IPActionThrottle против
+       настроенного кэша (CACHES['default']) и печатает среднее время
+       проверки в микросекундах.'''
+    help = 'Замеряет стоимость проверки throttling на запрос'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=10000,
+            help='Сколько проверок выполнить'
+        )
+        parser.add_argument(
+            '--users', type=int, default=100,
+            help='Среди скольких пользователей распределить запросы'
+        )
+
+    def handle(self, *args, **options):
+        total, users = options['requests'], options['users']
+        request = APIRequestFactory().get('/api/recipes/')
+        view = FakeView()
+        self.stdout.write(f"Кэш: {settings.CACHES['default']['BACKEND']}")
+        for throttle_class in (UserActionThrottle, IPActionThrottle):
+            throttle = throttle_class()
+            started = time.perf_counter()
+            for number in range(total):
+                request.user = FakeUser(number % users)
+                throttle.allow_request(request, view)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{throttle_class.__name__}: '
+                f'{elapsed / total * 1e6:.1f} мкс на запрос'
+            )
@@ -0,0 +1,167 @@
+import json
+import random
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.views import RecipeViewSet, UserViewSet
+from recipes.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingList)
+from users.models import Follow, User
+
+WATCHED_TABLES = {
+    model._meta.db_table
+    for model in (User, Follow, Recipe, RecipeIngredient,
+                  Favorites, ShoppingList)
+}
+
+
+def hot_queries(user, recipe):
+    '''Запросы, которые должны идти по индексам.
+
+       Берутся прямо из вьюх, чтобы фильтры видимости (is_deleted) и
+       аннотации совпадали с тем, что уходит в базу.'''
+    page = settings.QUERY_PLAN_PAGE_SIZE
+    return {
+        'download_shopping_cart': (
+            RecipeViewSet.shopping_cart_ingredients(user)
+        ),
+        'favorite_exists': Favorites.objects.filter(
+            user=user, recipe=recipe
+        ).values('pk')[:1],
+        'shopping_cart_exists': ShoppingList.objects.filter(
+            user=user, recipe=recipe
+        ).values('pk')[:1],
+        'subscriptions': UserViewSet.subscriptions_queryset(user)[:page],
+        'recipes_by_pub_date': RecipeViewSet.queryset.all()[:page],
+        'author_recipes': RecipeViewSet.queryset.filter(
+            author=recipe.author_id
+        )[:page],
+    }
+
+
+def walk(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from walk(child)
+
+
+def postgresql_problems(queryset, max_cost):
+    plan = json.loads(queryset.explain(format='json'))[0]['Plan']
+    problems = []
+    for node in walk(plan):
+        if (node['Node Type'] == 'Seq Scan'
+                and node.get('Relation Name') in WATCHED_TABLES):
+            problems.append(f"Seq Scan по {node['Relation Name']}")
+    if plan['Total Cost'] > max_cost:
+        problems.append(
+            f"стоимость {plan['Total Cost']} больше {max_cost}"
+        )
+    return problems
+
+
+def sqlite_problems(queryset, max_cost):
+    problems = []
+    for line in queryset.explain().splitlines():
+        match = re.search(r'\bSCAN (\w+)', line)
+        if (match and match.group(1) in WATCHED_TABLES
+                and 'INDEX' not in line):
+            problems.append(f'SCAN по {match.group(1)}')
+    return problems
+
+
+def seed(size):
+    '''Синтетические данные, чтобы планировщик выбирал как на проде.'''
+    users = User.objects.bulk_create(
+        User(username=f'plan_{number}', email=f'plan_{number}@example.com')
+        for number in range(max(size // 10, 2))
+    )
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f'plan_{number}', measurement_unit='г')
+        for number in range(max(size // 100, 10))
+    )
+    recipes = Recipe.objects.bulk_create(
+        Recipe(author=random.choice(users), title=f'plan_{number}',
+               description='', image='', cooking_time=1)
+        for number in range(size)
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                         quantity=1, unit='1')
+        for recipe in recipes
+        for ingredient in random.sample(ingredients, 5)
+    )
+    for model in (Favorites, ShoppingList):
+        model.objects.bulk_create(
+            model(user=user, recipe=recipe)
+            for user in users
+            for recipe in random.sample(recipes, min(len(recipes), 5))
+        )
+    Follow.objects.bulk_create(
+        Follow(user=user, author=author)
+        for user in users
+        for author in random.sample(users, 2)
+        if author != user
+    )
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            for table in WATCHED_TABLES:
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(table)}')
+
+
+class Command(BaseCommand):
+    '''Проверка планов горячих запросов через EXPLAIN.
+
+       Каждый запрос строится теми же ORM-вызовами, что и во вьюхах.
+       Команда падает с ненулевым кодом, если план ушёл в полный проход
+       по одной из больших таблиц или (на PostgreSQL) его стоимость
+       выше бюджета. С --seed данные создаются внутри транзакции,
+       которая откатывается после проверки.'''
+    help = 'Проверяет планы горячих запросов через EXPLAIN'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Сколько синтетических рецептов создать перед проверкой'
+        )
+        parser.add_argument(
+            '--max-cost', type=float, default=settings.QUERY_PLAN_MAX_COST,
+            help='Бюджет стоимости плана (PostgreSQL)'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'postgresql':
+            check = postgresql_problems
+        elif connection.vendor == 'sqlite':
+            check = sqlite_problems
+        else:
+            raise CommandError(f'EXPLAIN для {connection.vendor} не поддержан')
+
+        with transaction.atomic():
+            if options['seed']:
+                seed(options['seed'])
+            recipe = RecipeViewSet.queryset.order_by('?').first()
+            if recipe is None:
+                raise CommandError('Нет рецептов: запустите с --seed')
+            user = ShoppingList.objects.filter(
+                recipe=recipe
+            ).values_list('user', flat=True).first()
+            user = User.objects.get(pk=user) if user else recipe.author
+            # Вьюхи строят запросы для вошедшего пользователя.
+            user.is_authenticated = True
+            failures = {}
+            for name, queryset in hot_queries(user, recipe).items():
+                problems = check(queryset, options['max_cost'])
+                if problems:
+                    failures[name] = problems
+                self.stdout.write(
+                    f"{name}: {'; '.join(problems) or 'OK'}"
+                )
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(
+                f"Регрессия планов: {', '.join(failures)}"
+            )
@@ -0,0 +1,144 @@
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Exists, OuterRef, Value
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+from recipes.models import Change, Favorites, ShoppingList
+from users.models import Follow
+
+VALIDATOR_FIELDS = ('pk', 'updated_at', 'author__username',
+                    'author__first_name', 'author__last_name',
+                    'author__email', 'flag_favorited',
+                    'flag_in_shopping_cart', 'flag_subscribed')
+
+
+class ConditionalRecipeMixin:
+    '''ETag / Last-Modified для списка и карточки рецепта.
+
+       Валидатор строится по лёгкой выборке (pk, updated_at, поля
+       автора из ответа и флаги текущего пользователя) без сериализации,
+       так что 304 отдаётся дёшево. Правка тега сдвигает updated_at его
+       рецептов (см. recipes.signals). Флаги is_favorited,
+       is_in_shopping_cart и подписка на автора входят в ETag, поэтому
+       персональные ответы не путаются.
+       Last-Modified отдаём только анонимам в карточке рецепта: удаление
+       из избранного или сдвиг страницы не меняют MAX(updated_at).'''
+
+    def with_validator_flags(self, queryset):
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.annotate(
+                flag_favorited=Value(False),
+                flag_in_shopping_cart=Value(False),
+                flag_subscribed=Value(False),
+            )
+        return queryset.annotate(
+            flag_favorited=Exists(Favorites.objects.filter(
+                user_id=user.pk, recipe=OuterRef('pk')
+            )),
+            flag_in_shopping_cart=Exists(ShoppingList.objects.filter(
+                user_id=user.pk, recipe=OuterRef('pk')
+            )),
+            flag_subscribed=Exists(Follow.objects.filter(
+                user_id=user.pk, author=OuterRef('author')
+            )),
+        )
+
+    def make_etag(self, *parts):
+        payload = json.dumps(
+            [self.request.user.pk, *parts], cls=DjangoJSONEncoder
+        )
+        return quote_etag(hashlib.md5(payload.encode()).hexdigest())
+
+    def conditional(self, etag, last_modified, build_response):
+        timestamp = (
+            int(last_modified.timestamp()) if last_modified else None
+        )
+        not_modified = get_conditional_response(
+            self.request, etag=etag, last_modified=timestamp
+        )
+        response = not_modified or build_response()
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        row = get_object_or_404(
+            self.with_validator_flags(
+                self.filter_queryset(self.get_queryset())
+            ).prefetch_related(None).values_list(*VALIDATOR_FIELDS),
+            pk=kwargs[self.lookup_url_kwarg or self.lookup_field]
+        )
+        last_modified = None if request.user.is_authenticated else row[1]
+        return self.conditional(
+            self.make_etag(row), last_modified,
+            lambda: super(ConditionalRecipeMixin, self).retrieve(
+                request, *args, **kwargs
+            )
+        )
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self.paginate_queryset(
+            self.with_validator_flags(queryset).prefetch_related(
+                None
+            ).values_list(*VALIDATOR_FIELDS)
+        )
+        if rows is None:
+            return super().list(request, *args, **kwargs)
+        page = self.paginator.page
+        etag = self.make_etag(page.paginator.count, page.number, rows)
+
+        def build_response():
+            order = {row[0]: index for index, row in enumerate(rows)}
+            recipes = sorted(
+                self.with_validator_flags(queryset).filter(pk__in=order),
+                key=lambda recipe: order[recipe.pk]
+            )
+            serializer = self.get_serializer(recipes, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        return self.conditional(etag, None, build_response)
+
+
+class DeltaSyncMixin:
+    '''Режим ?changed_since=<token> для инкрементальной синхронизации.
+
+       Отдаёт объекты, изменённые после token, id удалённых объектов и
+       новый token. Изменения берутся из журнала Change, поэтому работа
+       пропорциональна числу изменений, а не размеру таблицы. Первая
+       синхронизация — changed_since=0; пока has_more, нужно повторять
+       запрос с новым token. Токен непрозрачный, клиент передаёт его
+       как есть.'''
+
+    def get_sync_token(self):
+        raw = self.request.query_params.get('changed_since') or '0'
+        try:
+            return Change.parse_token(raw)
+        except ValueError:
+            raise ValidationError(
+                {'changed_since': 'Некорректный токен синхронизации.'}
+            )
+
+    def delta_response(self, kind, queryset, user_id=None):
+        changed, removed, token, has_more = Change.objects.since(
+            kind, self.get_sync_token(), user_id
+        )
+        objects = {obj.pk: obj for obj in queryset.filter(pk__in=changed)}
+        serializer = self.get_serializer(
+            [objects[pk] for pk in changed if pk in objects], many=True
+        )
+        return Response({
+            'token': Change.format_token(token),
+            'has_more': has_more,
+            'changed': serializer.data,
+            'deleted': removed + [pk for pk in changed if pk not in objects],
+        })
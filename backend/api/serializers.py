@@ -14,7 +14,7 @@ from recipes.models import (
     Tag
 )
 
-from users.models import User
+from users.models import Follow, User
 
 
 class UserSerializer(UserSerializer):
@@ -28,12 +28,49 @@ class UserSerializer(UserSerializer):
                   'last_name', 'is_subscribed', 'password')
 
     def get_is_subscribed(self, obj):
-        '''Проверка подписки.'''
+        '''Проверка подписки.
+
+           Списки пользователей приходят с аннотацией is_subscribed
+           (User.objects.with_is_subscribed), отдельный запрос делаем
+           только для одиночных объектов без неё.'''
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
 
         user = self.context.get("request").user
 
-        return user.is_authenticated and \
-            user.subscriptions.filter(author=obj).exists()
+        return user.is_authenticated and Follow.objects.filter(
+            user_id=user.pk, author=obj
+        ).exists()
+
+
+class RecipeShortSerializer(serializers.ModelSerializer):
+    '''Краткая карточка рецепта для списка подписок.'''
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'title', 'image', 'cooking_time')
+        read_only_fields = fields
+
+
+class SubscriptionSerializer(UserSerializer):
+    '''Автор в списке подписок вместе со счётчиками.
+
+       Последние рецепты автора вьюха кладёт в атрибут latest_recipes
+       одним запросом на всю страницу.'''
+    recipes = SerializerMethodField()
+
+    class Meta(UserSerializer.Meta):
+        fields = ('email', 'id', 'username', 'first_name', 'last_name',
+                  'is_subscribed', 'recipes', 'recipes_count',
+                  'followers_count')
+        read_only_fields = fields
+
+    def get_recipes(self, obj):
+        return RecipeShortSerializer(
+            getattr(obj, 'latest_recipes', ()),
+            many=True,
+            context=self.context
+        ).data
 
 
 class UserCreateSerializer(UserCreateSerializer):
@@ -95,7 +132,7 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def get_ingredients(self, obj):
         '''Cписок ингридиентов для рецепта.'''
-        ingredients = RecipeIngredient.objects.filter(recipe=obj)
+        ingredients = obj.recipeingredient_set.all()
         return RecipeIngredientSerializer(ingredients, many=True).data
 
     def validate_cooking_time(self, cooking_time):
@@ -104,19 +141,29 @@ class RecipeSerializer(serializers.ModelSerializer):
                 'Время готовки должно быть не меньше одной минуты')
         return cooking_time
 
-    def get_is_favorited(self, obj):
+    def get_user(self):
         request = self.context.get('request')
-        user = request.user if request and \
-            not request.user.is_anonymous else None
-        return not user or \
-            not obj.favorites.filter(user=user).exists()
+        if request and not request.user.is_anonymous:
+            return request.user
+        return None
+
+    def get_is_favorited(self, obj):
+        '''Флаг берётся из аннотации flag_favorited, если она есть.'''
+        if hasattr(obj, 'flag_favorited'):
+            return obj.flag_favorited
+        user = self.get_user()
+        return user is not None and Favorites.objects.filter(
+            user_id=user.pk, recipe=obj
+        ).exists()
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        user = request.user if request and \
-            not request.user.is_anonymous else None
-        return not user or \
-            not obj.shopping_cart_items.filter(user=user).exists()
+        '''Флаг берётся из аннотации flag_in_shopping_cart, если она есть.'''
+        if hasattr(obj, 'flag_in_shopping_cart'):
+            return obj.flag_in_shopping_cart
+        user = self.get_user()
+        return user is not None and ShoppingList.objects.filter(
+            user_id=user.pk, recipe=obj
+        ).exists()
 
     def create(self, validated_data):
         '''Создание рецепта.'''
@@ -0,0 +1,84 @@
+import time
+
+from django.core.cache import cache as default_cache
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class ActionRateThrottle(SimpleRateThrottle):
+    '''Ограничение частоты запросов для отдельных действий viewset.
+
+       Действие выбирается через атрибут view.throttle_scopes
+       ({'create': 'recipe_write', ...}); для остальных действий
+       ограничения нет. Бюджет задаётся в DEFAULT_THROTTLE_RATES
+       ключом '<scope>_<kind>', например 'recipe_write_user'.
+
+       Вместо списка времён запросов, как в SimpleRateThrottle, в кэше
+       лежит счётчик на текущее окно: ёмкость корзины — число запросов,
+       окно — период пополнения. Счётчик увеличивается атомарным
+       cache.incr, поэтому проверка стоит один запрос к кэшу и работает
+       одинаково во всех процессах, которые делят общий кэш.'''
+    cache = default_cache
+    cache_format = 'throttle_%(scope)s_%(ident)s_%(window)s'
+    kind = None
+
+    def __init__(self):
+        pass
+
+    def get_ident_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        action_scope = getattr(view, 'throttle_scopes', {}).get(
+            getattr(view, 'action', None)
+        )
+        if action_scope is None:
+            return True
+        ident = self.get_ident_key(request)
+        if ident is None:
+            return True
+
+        self.scope = f'{action_scope}_{self.kind}'
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        if self.rate is None:
+            return True
+
+        now = self.timer()
+        window = int(now // self.duration)
+        self.wait_seconds = (window + 1) * self.duration - now
+        key = self.cache_format % {
+            'scope': self.scope, 'ident': ident, 'window': window
+        }
+        return self.increment(key) <= self.num_requests
+
+    def increment(self, key):
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            if self.cache.add(key, 1, self.duration):
+                return 1
+            return self.cache.incr(key)
+
+    def wait(self):
+        return self.wait_seconds
+
+    def timer(self):
+        return time.time()
+
+
+class UserActionThrottle(ActionRateThrottle):
+    '''Бюджет на пользователя; анонимов ограничивает IPActionThrottle.'''
+    kind = 'user'
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class IPActionThrottle(ActionRateThrottle):
+    '''Бюджет на IP-адрес клиента.'''
+    kind = 'ip'
+
+    def get_ident_key(self, request):
+        return self.get_ident(request)
@@ -1,22 +1,28 @@
-from django.db.models import Sum
+from django.db.models import F, Prefetch, Sum, Window
+from django.db.models.functions import RowNumber
+from django.conf import settings
 from django.http.response import HttpResponse
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
-from recipes.models import (Favorites, Ingredient, Recipe,
+from jobs.queue import enqueue
+from recipes.models import (Change, Favorites, Ingredient, Recipe,
                             RecipeIngredient, ShoppingList, Tag)
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.permissions import (IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
-from users.models import Follow, User
+from users.models import Follow, User, change_counter
+from .mixins import ConditionalRecipeMixin, DeltaSyncMixin
 from .pagination import CustomPagination
 from .permissions import AuthorPermission
+from .throttling import IPActionThrottle, UserActionThrottle
 from .serializers import (FavoritesSerializer, IngredientSerializer,
                           RecipeSerializer, ShoppingListSerializer,
-                          TagSerializer, UserSerializer)
+                          SubscriptionSerializer, TagSerializer,
+                          UserSerializer)
 
 
 class TagViewSet(viewsets.ModelViewSet):
@@ -27,20 +33,123 @@ class TagViewSet(viewsets.ModelViewSet):
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(DeltaSyncMixin, viewsets.ReadOnlyModelViewSet):
     '''Работа с Ingredient.'''
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
     permission_classes = (IsAuthenticatedOrReadOnly, )
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        if 'changed_since' in request.query_params:
+            return self.delta_response(Change.INGREDIENT, self.queryset)
+        return super().list(request, *args, **kwargs)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(ConditionalRecipeMixin, DeltaSyncMixin,
+                    viewsets.ModelViewSet):
     '''Работа с Recipe.'''
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.filter(
+        is_deleted=False, author__is_deleted=False
+    )
     serializer_class = RecipeSerializer
     permission_classes = (AuthorPermission, )
     pagination_class = CustomPagination
+    throttle_classes = (UserActionThrottle, IPActionThrottle)
+    throttle_scopes = {
+        'create': 'recipe_write',
+        'update': 'recipe_write',
+        'partial_update': 'recipe_write',
+        'download_shopping_cart': 'export',
+    }
+
+    def get_queryset(self):
+        return super().get_queryset().prefetch_related(
+            'tags',
+            Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+            Prefetch(
+                'author',
+                queryset=User.objects.with_is_subscribed(self.request.user)
+            ),
+        )
+
+    def list(self, request, *args, **kwargs):
+        if 'ids' in request.query_params:
+            return self.get_many(request.query_params['ids'].split(','))
+        if 'changed_since' in request.query_params:
+            return self.delta_response(
+                Change.RECIPE, self.with_validator_flags(self.get_queryset())
+            )
+        return super().list(request, *args, **kwargs)
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def favorites(self, request):
+        '''Избранное пользователя, ?changed_since= для синхронизации.'''
+        return self.delta_response(
+            Change.FAVORITE,
+            self.with_validator_flags(self.get_queryset()).filter(
+                favorite_recipes__user_id=request.user.pk
+            ),
+            user_id=request.user.pk
+        )
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def shopping_list(self, request):
+        '''Список покупок пользователя, ?changed_since= для синхронизации.'''
+        return self.delta_response(
+            Change.SHOPPING_LIST,
+            self.with_validator_flags(self.get_queryset()).filter(
+                shopping_list__user_id=request.user.pk
+            ),
+            user_id=request.user.pk
+        )
+
+    @action(detail=False, methods=('POST',))
+    def batch(self, request):
+        '''Несколько рецептов по списку id в теле запроса.'''
+        ids = request.data.get('ids')
+        if not isinstance(ids, list):
+            raise ValidationError({'ids': 'Ожидается список id.'})
+        return self.get_many(ids)
+
+    def get_many(self, raw_ids):
+        '''Рецепты по списку id одним запросом с prefetch.
+
+           Порядок ответа совпадает с порядком id в запросе, id, которых
+           нет, перечислены в missing.'''
+        try:
+            ids = list(dict.fromkeys(
+                int(pk) for pk in raw_ids if str(pk).strip()
+            ))
+        except (TypeError, ValueError):
+            raise ValidationError({'ids': 'id должны быть целыми числами.'})
+        if len(ids) > settings.RECIPES_BATCH_MAX:
+            raise ValidationError({
+                'ids': f'Не больше {settings.RECIPES_BATCH_MAX} id за запрос.'
+            })
+        recipes = {
+            recipe.pk: recipe
+            for recipe in self.with_validator_flags(
+                self.get_queryset().filter(pk__in=ids)
+            )
+        }
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in ids if pk in recipes], many=True
+        )
+        return Response({
+            'results': serializer.data,
+            'missing': [pk for pk in ids if pk not in recipes],
+        })
+
+    def perform_destroy(self, instance):
+        '''Рецепт сразу скрывается, строки удаляются в фоне.'''
+        instance.is_deleted = True
+        instance.save(update_fields=['is_deleted'])
+        change_counter(instance.author_id, 'recipes_count', -1)
+        enqueue('recipes.purge_recipe', recipe_id=instance.pk)
 
     @staticmethod
     def send_message(ingredients):
@@ -59,15 +168,24 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['GET'])
     def download_shopping_cart(self, request):
         '''Zагрузкa списка покупок.'''
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shopping_list__user=request.user
+        return self.send_message(
+            self.shopping_cart_ingredients(request.user)
+        )
+
+    @staticmethod
+    def shopping_cart_ingredients(user):
+        '''Сумма ингредиентов по всем рецептам из списка покупок.'''
+        return RecipeIngredient.objects.filter(
+            recipe__shopping_list__user_id=user.pk,
+            recipe__is_deleted=False,
+            recipe__author__is_deleted=False
         ).order_by('ingredient__name').values(
             'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-        return self.send_message(ingredients)
+        ).annotate(amount=Sum('quantity'))
 
     @staticmethod
-    def add_to_list(request, recipe, serializer_class):
+    def add_to_list(request, recipe, serializer_class,
+                    update_counters=False):
         context = {'request': request}
         data = {
             'user': request.user.id,
@@ -76,6 +194,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer = serializer_class(data=data, context=context)
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        if update_counters:
+            enqueue('recipes.update_counters', recipe_id=recipe.id)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(
@@ -84,7 +204,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated])
     def shopping_cart(self, request, pk):
         '''Dобавляет рецепт в список покупок.'''
-        recipe = get_object_or_404(Recipe, id=pk)
+        recipe = get_object_or_404(self.get_queryset(), id=pk)
         return self.add_to_list(request, recipe, ShoppingListSerializer)
 
     @shopping_cart.mapping.delete
@@ -93,7 +213,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         get_object_or_404(
             ShoppingList,
             user=request.user.id,
-            recipe=get_object_or_404(Recipe, id=pk)
+            recipe=get_object_or_404(self.get_queryset(), id=pk)
         ).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -103,8 +223,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated])
     def favorite(self, request, pk):
         '''Dобавляет рецепт в избранное.'''
-        recipe = get_object_or_404(Recipe, id=pk)
-        return self.add_to_list(request, recipe, FavoritesSerializer)
+        recipe = get_object_or_404(self.get_queryset(), id=pk)
+        return self.add_to_list(
+            request, recipe, FavoritesSerializer, update_counters=True
+        )
 
     @favorite.mapping.delete
     def destroy_favorite(self, request, pk):
@@ -112,17 +234,33 @@ class RecipeViewSet(viewsets.ModelViewSet):
         get_object_or_404(
             Favorites,
             user=request.user,
-            recipe=get_object_or_404(Recipe, id=pk)
+            recipe=get_object_or_404(self.get_queryset(), id=pk)
         ).delete()
+        enqueue('recipes.update_counters', recipe_id=pk)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class UserViewSet(UserViewSet):
     '''Работа с User.'''
-    queryset = User.objects.all()
+    queryset = User.objects.filter(is_deleted=False)
     serializer_class = UserSerializer
     pagination_class = CustomPagination
 
+    def get_queryset(self):
+        return super().get_queryset().with_is_subscribed(self.request.user)
+
+    def perform_destroy(self, instance):
+        '''Пользователь сразу скрывается, его данные удаляются в фоне.
+
+           Его подписки сразу перестают учитываться в followers_count
+           авторов, как и рецепты в recipes_count.'''
+        instance.is_deleted = True
+        instance.save(update_fields=['is_deleted'])
+        User.objects.filter(follower__user=instance).update(
+            followers_count=F('followers_count') - 1
+        )
+        enqueue('users.purge_user', user_id=instance.pk)
+
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -131,15 +269,18 @@ class UserViewSet(UserViewSet):
     def subscribe(self, request, id):
         '''Для подписок.'''
         user = request.user
-        author = get_object_or_404(User, pk=id)
+        author = get_object_or_404(self.queryset, pk=id)
 
         if request.method == 'POST':
             if Follow.objects.filter(user=user, author=author).exists():
                 raise PermissionDenied('Вы уже подписаны на этого автора')
 
-            serializer = UserSerializer(author, context={'request': request})
-            serializer.is_valid(raise_exception=True)
             Follow.objects.create(user=user, author=author)
+            author.refresh_from_db(fields=['followers_count'])
+            self.attach_latest_recipes([author])
+            serializer = SubscriptionSerializer(
+                author, context={'request': request}
+            )
 
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -152,11 +293,53 @@ class UserViewSet(UserViewSet):
     @action(detail=False, permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
         '''Для списка подписок.'''
-        user = request.user
-        queryset = User.objects.filter(following__user=user)
-        pages = self.paginate_queryset(queryset)
-        serializer = UserSerializer(
+        pages = self.paginate_queryset(
+            self.subscriptions_queryset(request.user)
+        )
+        self.attach_latest_recipes(pages)
+        serializer = SubscriptionSerializer(
             pages, many=True, context={'request': request}
         )
 
         return self.get_paginated_response(serializer.data)
+
+    @staticmethod
+    def subscriptions_queryset(user):
+        '''Авторы, на которых подписан user.'''
+        return User.objects.filter(
+            follower__user_id=user.pk, is_deleted=False
+        ).with_is_subscribed(user).order_by('pk')
+
+    def get_recipes_limit(self):
+        raw = self.request.query_params.get('recipes_limit')
+        if raw is None:
+            return settings.SUBSCRIPTION_RECIPES_LIMIT
+        try:
+            limit = int(raw)
+        except ValueError:
+            limit = -1
+        if limit < 0:
+            raise ValidationError(
+                {'recipes_limit': 'Ожидается неотрицательное целое число.'}
+            )
+        return limit
+
+    def attach_latest_recipes(self, authors):
+        '''Кладёт авторам latest_recipes — их последние рецепты.
+
+           Для всей страницы один запрос с ROW_NUMBER() OVER (PARTITION BY
+           author ORDER BY pub_date DESC), а не запрос на автора.'''
+        limit = self.get_recipes_limit()
+        latest = {author.pk: [] for author in authors}
+        if latest and limit:
+            recipes = Recipe.objects.filter(
+                author_id__in=latest, is_deleted=False
+            ).annotate(position=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=F('pub_date').desc()
+            )).filter(position__lte=limit).order_by('author_id', 'position')
+            for recipe in recipes:
+                latest[recipe.author_id].append(recipe)
+        for author in authors:
+            author.latest_recipes = latest[author.pk]
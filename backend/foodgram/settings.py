@@ -23,6 +23,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'recipes.apps.RecipesConfig',
     'api.apps.ApiConfig',
+    'jobs.apps.JobsConfig',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -104,6 +105,17 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.AllowAny",
@@ -111,6 +123,13 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.TokenAuthentication",
     ],
+    "NUM_PROXIES": int(os.getenv('NUM_PROXIES', 1)),
+    "DEFAULT_THROTTLE_RATES": {
+        "recipe_write_user": os.getenv('THROTTLE_RECIPE_WRITE_USER', '30/min'),
+        "recipe_write_ip": os.getenv('THROTTLE_RECIPE_WRITE_IP', '60/min'),
+        "export_user": os.getenv('THROTTLE_EXPORT_USER', '10/min'),
+        "export_ip": os.getenv('THROTTLE_EXPORT_IP', '20/min'),
+    },
 }
 
 DJOSER = {
@@ -138,3 +157,31 @@ MAX_LENGTH_7 = 7
 MAX_DIGITS_5 = 5
 
 DECIMAL_PLACES_2 = 2
+
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 10000
+
+RECIPES_BATCH_MAX = 100
+
+SYNC_MAX_CHANGES = 500
+
+SUBSCRIPTION_RECIPES_LIMIT = 3
+
+QUERY_PLAN_MAX_COST = 1000
+
+QUERY_PLAN_PAGE_SIZE = 6
+
+JOBS_WORKERS = 4
+
+JOBS_POLL_INTERVAL = 1
+
+JOBS_MAX_ATTEMPTS = 5
+
+JOBS_BACKOFF_SECONDS = 10
+
+JOBS_BACKOFF_MAX_SECONDS = 3600
+
+JOBS_STALE_SECONDS = 3600
+
+JOBS_CLAIM_CANDIDATES = 10
+
+PURGE_BATCH_SIZE = 1000
@@ -0,0 +1,19 @@
+from django.contrib import admin
+
+from foodgram.paginator import EstimatedCountPaginator
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    """Просмотр фоновых задач в админ панели."""
+    list_display = ('name', 'status', 'attempts', 'run_after',
+                    'finished_at', 'duration')
+    list_filter = ('status', 'name')
+    search_fields = ('name__startswith',)
+    readonly_fields = ('created_at', 'started_at', 'finished_at',
+                       'duration', 'last_error')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+admin.site.register(Job, JobAdmin)
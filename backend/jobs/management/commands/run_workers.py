@@ -0,0 +1,118 @@
+import logging
+import signal
+import threading
+import time
+from multiprocessing import Process
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from jobs.queue import claim, requeue_stale, run
+
+logger = logging.getLogger(__name__)
+
+
+def work(stop, poll_interval, once):
+    '''Цикл одного воркера: забрать задачу, выполнить, повторить.
+
+       Ошибка базы (перезапуск, обрыв соединения) не должна убивать
+       воркер: пишем её в лог, ждём poll_interval и опрашиваем снова.'''
+    try:
+        while not stop.is_set():
+            try:
+                close_old_connections()
+                job = claim()
+                if job is not None:
+                    run(job)
+                    continue
+            except Exception:
+                logger.exception('Ошибка воркера, повтор через %s с',
+                                 poll_interval)
+            if once:
+                return
+            stop.wait(poll_interval)
+    finally:
+        connections.close_all()
+
+
+def work_in_process(poll_interval, once):
+    connections.close_all()
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    signal.signal(signal.SIGINT, lambda *args: stop.set())
+    work(stop, poll_interval, once)
+
+
+class Command(BaseCommand):
+    '''Запуск пула воркеров фоновых задач.
+
+       Очередь — таблица jobs.Job, внешний брокер не нужен. Потоки
+       подходят для задач, которые ждут базу или диск; процессы — для
+       задач, занятых CPU (например, обработка изображений).'''
+    help = 'Запускает воркеры фоновых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.JOBS_WORKERS,
+            help='Количество воркеров'
+        )
+        parser.add_argument(
+            '--mode', choices=('thread', 'process'), default='thread',
+            help='Воркеры-потоки или воркеры-процессы'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=settings.JOBS_POLL_INTERVAL,
+            help='Пауза между опросами пустой очереди, с'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и выйти'
+        )
+
+    def handle(self, *args, **options):
+        workers, mode = options['workers'], options['mode']
+        poll_interval, once = options['poll_interval'], options['once']
+        requeued = requeue_stale()
+        if requeued:
+            self.stdout.write(f'Возвращено в очередь задач: {requeued}')
+        self.stdout.write(f'Запущено воркеров: {workers} ({mode})')
+        if mode == 'process':
+            self.run_processes(workers, poll_interval, once)
+        else:
+            self.run_threads(workers, poll_interval, once)
+
+    def run_threads(self, workers, poll_interval, once):
+        stop = threading.Event()
+        threads = [
+            threading.Thread(
+                target=work, args=(stop, poll_interval, once), daemon=True
+            )
+            for _ in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def run_processes(self, workers, poll_interval, once):
+        connections.close_all()
+        processes = [
+            Process(target=work_in_process, args=(poll_interval, once))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+                process.join()
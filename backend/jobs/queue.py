@@ -0,0 +1,118 @@
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def register(name):
+    '''Декоратор: регистрирует функцию как обработчик задачи name.
+
+       Обработчики объявляются в модулях <app>/jobs.py, они подгружаются
+       при старте приложения.'''
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, delay=0, **payload):
+    '''Ставит задачу в очередь. payload должен сериализоваться в JSON.'''
+    if name not in _registry:
+        raise KeyError(f'Неизвестная задача: {name}')
+    return Job.objects.create(
+        name=name,
+        payload=payload,
+        run_after=timezone.now() + timedelta(seconds=delay)
+    )
+
+
+def claim():
+    '''Забирает одну готовую к запуску задачу или возвращает None.
+
+       На PostgreSQL строки блокируются через SELECT ... FOR UPDATE
+       SKIP LOCKED, так что воркеры не ждут друг друга. Там, где
+       SKIP LOCKED нет (SQLite), задачу захватывает тот, чей условный
+       UPDATE по статусу затронул строку.'''
+    now = timezone.now()
+    ready = Job.objects.filter(
+        status=Job.PENDING, run_after__lte=now
+    ).order_by('run_after')
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = ready.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.status = Job.RUNNING
+            job.started_at = now
+            job.attempts += 1
+            job.save(update_fields=['status', 'started_at', 'attempts'])
+            return job
+    for job in ready[:settings.JOBS_CLAIM_CANDIDATES]:
+        claimed = Job.objects.filter(
+            pk=job.pk, status=Job.PENDING
+        ).update(status=Job.RUNNING, started_at=now, attempts=job.attempts + 1)
+        if claimed:
+            job.status = Job.RUNNING
+            job.started_at = now
+            job.attempts += 1
+            return job
+    return None
+
+
+def backoff(attempts):
+    '''Экспоненциальная задержка перед следующей попыткой, в секундах.'''
+    return min(
+        settings.JOBS_BACKOFF_SECONDS * 2 ** (attempts - 1),
+        settings.JOBS_BACKOFF_MAX_SECONDS
+    )
+
+
+def run(job):
+    '''Выполняет захваченную задачу и сохраняет результат и метрики.'''
+    started = time.monotonic()
+    try:
+        _registry[job.name](**job.payload)
+    except Exception:
+        job.duration = time.monotonic() - started
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+        else:
+            job.status = Job.PENDING
+            job.run_after = timezone.now() + timedelta(
+                seconds=backoff(job.attempts)
+            )
+        logger.warning(
+            'Задача %s #%s упала (попытка %s)',
+            job.name, job.pk, job.attempts
+        )
+    else:
+        job.duration = time.monotonic() - started
+        job.status = Job.DONE
+        job.finished_at = timezone.now()
+        logger.info('Задача %s выполнена за %.3f с', job, job.duration)
+    job.save(update_fields=[
+        'status', 'run_after', 'finished_at', 'duration', 'last_error'
+    ])
+    return job
+
+
+def requeue_stale():
+    '''Возвращает в очередь задачи, чей воркер умер посреди работы.'''
+    deadline = timezone.now() - timedelta(
+        seconds=settings.JOBS_STALE_SECONDS
+    )
+    return Job.objects.filter(
+        status=Job.RUNNING, started_at__lt=deadline
+    ).update(status=Job.PENDING)
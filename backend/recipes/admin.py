@@ -1,4 +1,6 @@
 from django.contrib import admin
+
+from foodgram.paginator import EstimatedCountPaginator
 from .models import (Tag, Ingredient, Recipe,
                      Favorites, ShoppingList)
 
@@ -13,29 +15,40 @@ class TagAdmin(admin.ModelAdmin):
 class IngredientAdmin(admin.ModelAdmin):
     """Управление ингридиентами в админ панели."""
     list_display = ('name', 'measurement_unit')
-    search_fields = ('name',)
+    search_fields = ('name__startswith',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('author', 'title', 'cooking_time',
                     'favorites_count', 'ingredients_count')
-    search_fields = ('author', 'title', 'tags__name',
-                     'favorites_count', 'ingredients_count')
-    list_filter = ('tags', 'favorites_count', 'ingredients_count')
+    list_select_related = ('author',)
+    search_fields = ('title__startswith', 'author__username__startswith')
+    list_filter = ('tags',)
+    autocomplete_fields = ('author',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class FavoritesAdmin(admin.ModelAdmin):
     """Управление подписками в админ панели."""
     list_display = ('recipe', 'user')
-    list_filter = ('recipe', 'user')
-    search_fields = ('recipe', 'user')
+    list_select_related = ('recipe', 'user')
+    search_fields = ('recipe__title__startswith', 'user__username__startswith')
+    autocomplete_fields = ('recipe', 'user')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class ShoppingListAdmin(admin.ModelAdmin):
     """Управление списком покупок в админ панели."""
     list_display = ('recipe', 'user')
-    list_filter = ('recipe', 'user')
-    search_fields = ('user', )
+    list_select_related = ('recipe', 'user')
+    search_fields = ('recipe__title__startswith', 'user__username__startswith')
+    autocomplete_fields = ('recipe', 'user')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(Ingredient, IngredientAdmin)
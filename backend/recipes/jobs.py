@@ -0,0 +1,26 @@
+from jobs.queue import register
+
+from . import purge
+from .models import Recipe
+
+
+@register('recipes.update_counters')
+def update_counters(recipe_id):
+    '''Пересчёт счётчиков избранного и ингредиентов у рецепта.'''
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None:
+        return
+    recipe.update_favorites_count()
+    recipe.update_ingredients_count()
+
+
+@register('recipes.purge_recipe')
+def purge_recipe(recipe_id):
+    '''Фоновое удаление рецепта, помеченного is_deleted.'''
+    purge.purge_recipe(recipe_id)
+
+
+@register('users.purge_user')
+def purge_user(user_id):
+    '''Фоновое удаление пользователя, помеченного is_deleted.'''
+    purge.purge_user(user_id)
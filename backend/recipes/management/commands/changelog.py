@@ -0,0 +1,86 @@
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from recipes.models import Change, Favorites, Ingredient, Recipe, ShoppingList
+
+
+class Command(BaseCommand):
+    '''Обслуживание журнала изменений для синхронизации.
+
+       --backfill записывает текущее состояние всех объектов, чтобы
+       клиенты могли начать синхронизацию с changed_since=0 на данных,
+       созданных до появления журнала. --compact оставляет по одной
+       последней записи на объект: токены клиентов остаются валидными,
+       потому что итоговое состояние объекта хранится в последней
+       записи.'''
+    help = 'Заполняет и сжимает журнал изменений'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help='Записать в журнал все существующие объекты'
+        )
+        parser.add_argument(
+            '--compact', action='store_true',
+            help='Удалить записи, перекрытые более новыми'
+        )
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            self.backfill()
+        if options['compact']:
+            self.compact()
+
+    @transaction.atomic
+    def backfill(self):
+        '''Одна транзакция: все записи получают один номер транзакции и
+           становятся видны клиентам одновременно.'''
+        sources = (
+            (Change.RECIPE, Recipe.objects.filter(
+                is_deleted=False, author__is_deleted=False
+            ).values_list('pk', 'pk')),
+            (Change.INGREDIENT, Ingredient.objects.values_list('pk', 'pk')),
+            (Change.FAVORITE,
+             Favorites.objects.values_list('recipe_id', 'user_id')),
+            (Change.SHOPPING_LIST,
+             ShoppingList.objects.values_list('recipe_id', 'user_id')),
+        )
+        transaction_id = Change.current_transaction_id()
+        for kind, rows in sources:
+            per_user = kind in (Change.FAVORITE, Change.SHOPPING_LIST)
+            rows = rows.order_by().iterator(
+                chunk_size=settings.PURGE_BATCH_SIZE
+            )
+            total = 0
+            while True:
+                batch = list(islice(rows, settings.PURGE_BATCH_SIZE))
+                if not batch:
+                    break
+                Change.objects.bulk_create(
+                    Change(kind=kind, object_id=object_id,
+                           user_id=owner if per_user else None,
+                           transaction_id=transaction_id)
+                    for object_id, owner in batch
+                )
+                total += len(batch)
+            self.stdout.write(f'{kind}: записано {total}')
+
+    def compact(self):
+        newer = Change.objects.filter(
+            Q(transaction_id__gt=OuterRef('transaction_id'))
+            | Q(transaction_id=OuterRef('transaction_id'),
+                pk__gt=OuterRef('pk')),
+            kind=OuterRef('kind'),
+            object_id=OuterRef('object_id'),
+        )
+        shared, _ = Change.objects.filter(user_id__isnull=True).filter(
+            Exists(newer.filter(user_id__isnull=True))
+        ).delete()
+        personal, _ = Change.objects.filter(user_id__isnull=False).filter(
+            Exists(newer.filter(user_id=OuterRef('user_id')))
+        ).delete()
+        self.stdout.write(f'Удалено записей: {shared + personal}')
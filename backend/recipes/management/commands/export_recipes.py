@@ -0,0 +1,80 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+
+from recipes.models import Recipe, RecipeIngredient
+
+
+class Command(BaseCommand):
+    '''Выгрузка рецептов в формате JSON Lines.
+
+       Рецепты читаются через iterator(chunk_size=...), ингредиенты и теги
+       подгружаются на каждую пачку, так что память не зависит от размера
+       таблицы.'''
+    help = 'Выгружает рецепты с ингредиентами и тегами в JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-o', '--output',
+            help='Файл для выгрузки, по умолчанию stdout'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько рецептов читать из базы за раз'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        ).filter(
+            is_deleted=False, author__is_deleted=False
+        ).order_by('pk')
+        output = options['output']
+        stream = open(output, 'w', encoding='utf-8') if output else None
+        count = 0
+        try:
+            for recipe in recipes.iterator(chunk_size=options['chunk_size']):
+                line = json.dumps(
+                    self.recipe_to_dict(recipe),
+                    cls=DjangoJSONEncoder,
+                    ensure_ascii=False
+                )
+                if stream:
+                    stream.write(line + '\n')
+                else:
+                    self.stdout.write(line)
+                count += 1
+        finally:
+            if stream:
+                stream.close()
+        self.stderr.write(f'Выгружено рецептов: {count}')
+
+    @staticmethod
+    def recipe_to_dict(recipe):
+        return {
+            'id': recipe.pk,
+            'author': recipe.author.email,
+            'title': recipe.title,
+            'description': recipe.description,
+            'image': recipe.image.name,
+            'cooking_time': recipe.cooking_time,
+            'pub_date': recipe.pub_date,
+            'tags': [
+                {'name': tag.name, 'color_code': tag.color_code,
+                 'slug': tag.slug}
+                for tag in recipe.tags.all()
+            ],
+            'ingredients': [
+                {'name': item.ingredient.name,
+                 'measurement_unit': item.ingredient.measurement_unit,
+                 'quantity': item.quantity,
+                 'unit': item.unit}
+                for item in recipe.recipeingredient_set.all()
+            ],
+        }
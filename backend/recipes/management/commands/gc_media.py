@@ -0,0 +1,91 @@
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+
+
+def walk_files(root):
+    '''Потоковый обход каталога без построения полного списка файлов.'''
+    try:
+        entries = os.scandir(root)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk_files(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+class Command(BaseCommand):
+    '''Удаление картинок рецептов, на которые больше нет ссылок.
+
+       MEDIA_ROOT обходится потоково, имена проверяются пачками по
+       индексу Recipe.image. Файлы моложе --grace-hours не трогаем:
+       рецепт с ними может быть ещё не сохранён.'''
+    help = 'Удаляет неиспользуемые файлы изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=float, default=24,
+            help='Не удалять файлы моложе стольких часов'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько имён проверять одним запросом'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что было бы удалено'
+        )
+
+    def handle(self, *args, **options):
+        upload_to = Recipe._meta.get_field('image').upload_to
+        root = os.path.join(settings.MEDIA_ROOT, upload_to)
+        deadline = time.time() - options['grace_hours'] * 3600
+        files = (
+            entry for entry in walk_files(root)
+            if entry.stat().st_mtime < deadline
+        )
+        checked = removed = freed = 0
+        while True:
+            batch = list(islice(files, options['batch_size']))
+            if not batch:
+                break
+            names = {
+                os.path.relpath(entry.path, settings.MEDIA_ROOT).replace(
+                    os.sep, '/'
+                ): entry
+                for entry in batch
+            }
+            used = set(Recipe.objects.filter(
+                image__in=list(names)
+            ).values_list('image', flat=True))
+            for name, entry in names.items():
+                if name in used:
+                    continue
+                # DirEntry.stat() закэширован при обходе, а сохранение
+                # того же содержимого обновляет mtime (см. storage).
+                try:
+                    stat = os.stat(entry.path)
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime >= deadline:
+                    continue
+                freed += stat.st_size
+                removed += 1
+                if not options['dry_run']:
+                    os.remove(entry.path)
+            checked += len(batch)
+            self.stdout.write(
+                f'Проверено: {checked}, удалено: {removed}'
+            )
+        self.stdout.write(
+            f'Итого удалено файлов: {removed}, '
+            f'освобождено {freed // 1024} КБ'
+        )
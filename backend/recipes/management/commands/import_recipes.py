@@ -0,0 +1,227 @@
+import json
+import sys
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.utils.dateparse import parse_datetime
+
+from recipes.models import (Change, Ingredient, Recipe, RecipeIngredient,
+                            Tag)
+from users.models import User, change_counter
+
+
+def close_connections():
+    '''Дочерним процессам нельзя делить соединение с родителем.'''
+    connections.close_all()
+
+
+def resolve_tags(rows):
+    '''Теги по slug; недостающие создаются одним запросом.
+
+       Вставка идёт в порядке slug, чтобы параллельные пачки брали
+       блокировки уникальных индексов в одном порядке. Тег, чьё имя уже
+       занято тегом с другим slug, не создаётся и в ответ не попадает.'''
+    tags = {
+        tag['slug']: tag for row in rows for tag in row['tags']
+    }
+    with transaction.atomic():
+        Tag.objects.bulk_create(
+            [Tag(**tags[slug]) for slug in sorted(tags)],
+            ignore_conflicts=True
+        )
+    return Tag.objects.in_bulk(list(tags), field_name='slug')
+
+
+def find_ingredients(keys):
+    return {
+        (ingredient.name, ingredient.measurement_unit): ingredient
+        for ingredient in Ingredient.objects.filter(
+            name__in={name for name, _ in keys}
+        )
+    }
+
+
+def resolve_ingredients(rows):
+    '''Ингредиенты по (name, measurement_unit); недостающие создаются
+       в порядке ключа, как и теги. В журнал пишутся только созданные:
+       уже известные клиентам ингредиенты не меняются.'''
+    keys = sorted({
+        (item['name'], item['measurement_unit'])
+        for row in rows for item in row['ingredients']
+    })
+    ingredients = find_ingredients(keys)
+    missing = [key for key in keys if key not in ingredients]
+    if not missing:
+        return ingredients
+    with transaction.atomic():
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=unit)
+             for name, unit in missing],
+            ignore_conflicts=True
+        )
+        ingredients = find_ingredients(keys)
+        Change.log(
+            Change.INGREDIENT,
+            [ingredients[key].pk for key in missing if key in ingredients]
+        )
+    return ingredients
+
+
+def import_batch(lines):
+    '''Импорт одной пачки строк.
+
+       Справочники (теги, ингредиенты) пополняются в своих коротких
+       транзакциях до вставки рецептов: блокировки на общих строках не
+       держатся всё время вставки пачки. Возвращает пару (создано,
+       пропущено); пропускаются строки без автора и с тегом, который не
+       удалось создать.'''
+    rows = [json.loads(line) for line in lines]
+    authors = User.objects.in_bulk(
+        {row['author'] for row in rows}, field_name='email'
+    )
+    rows = [row for row in rows if row['author'] in authors]
+    if not rows:
+        return 0, len(lines)
+
+    tags = resolve_tags(rows)
+    rows = [
+        row for row in rows
+        if all(tag['slug'] in tags for tag in row['tags'])
+    ]
+    if not rows:
+        return 0, len(lines)
+    ingredients = resolve_ingredients(rows)
+    with transaction.atomic():
+        recipes = Recipe.objects.bulk_create([
+            Recipe(
+                author=authors[row['author']],
+                title=row['title'],
+                description=row['description'],
+                image=row['image'],
+                cooking_time=row['cooking_time'],
+                ingredients_count=len(row['ingredients']),
+            )
+            for row in rows
+        ])
+        authored = Counter(recipe.author_id for recipe in recipes)
+        for author_id, count in authored.items():
+            change_counter(author_id, 'recipes_count', count)
+        dated = []
+        for recipe, row in zip(recipes, rows):
+            if row.get('pub_date'):
+                recipe.pub_date = parse_datetime(row['pub_date'])
+                dated.append(recipe)
+        if dated:
+            Recipe.objects.bulk_update(dated, ['pub_date'])
+        recipe_tag = Recipe.tags.through
+        recipe_tag.objects.bulk_create([
+            recipe_tag(recipe_id=recipe.pk, tag_id=tags[tag['slug']].pk)
+            for recipe, row in zip(recipes, rows)
+            for tag in row['tags']
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredients[
+                    (item['name'], item['measurement_unit'])
+                ],
+                quantity=item['quantity'],
+                unit=item['unit'],
+            )
+            for recipe, row in zip(recipes, rows)
+            for item in row['ingredients']
+        ])
+        Change.log(Change.RECIPE, [recipe.pk for recipe in recipes])
+    return len(recipes), len(lines) - len(recipes)
+
+
+def batched(lines, size):
+    iterator = iter(lines)
+    while True:
+        batch = [line for line in islice(iterator, size) if line.strip()]
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    '''Загрузка рецептов из JSON Lines, выгруженных export_recipes.
+
+       Файл читается построчно, пачки по --batch-size строк импортируются
+       в отдельных транзакциях через bulk_create. С --workers больше 1
+       пачки раздаются пулу процессов; в очереди держим не больше двух
+       пачек на процесс, чтобы память не росла с размером файла.
+       Авторы ищутся по email и должны уже существовать; строки без
+       автора или с тегом, имя которого занято другим slug, пропускаются.'''
+    help = 'Загружает рецепты из JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            help='Файл с рецептами, по умолчанию stdin'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько рецептов вставлять в одной транзакции'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Количество процессов для импорта'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        stream = open(path, encoding='utf-8') if path else sys.stdin
+        try:
+            batches = batched(stream, options['batch_size'])
+            if options['workers'] > 1:
+                created, skipped = self.import_parallel(
+                    batches, options['workers']
+                )
+            else:
+                created, skipped = self.import_serial(batches)
+        finally:
+            if path:
+                stream.close()
+        self.stdout.write(
+            f'Загружено рецептов: {created}, '
+            f'пропущено: {skipped}'
+        )
+
+    def import_serial(self, batches):
+        created = skipped = 0
+        for batch in batches:
+            done, missed = import_batch(batch)
+            created += done
+            skipped += missed
+            self.report(created)
+        return created, skipped
+
+    def import_parallel(self, batches, workers):
+        created = skipped = 0
+        close_connections()
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=close_connections
+        ) as executor:
+            pending = set()
+            for batch in batches:
+                pending.add(executor.submit(import_batch, batch))
+                if len(pending) < workers * 2:
+                    continue
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    done, missed = future.result()
+                    created += done
+                    skipped += missed
+                self.report(created)
+            for future in pending:
+                done, missed = future.result()
+                created += done
+                skipped += missed
+        return created, skipped
+
+    def report(self, created):
+        self.stderr.write(f'Загружено: {created}')
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.purge import purge_recipe, purge_user
+from users.models import User
+
+
+class Command(BaseCommand):
+    '''Синхронная очистка всех помеченных is_deleted объектов.
+
+       Обычно это делают фоновые задачи recipes.purge_recipe и
+       users.purge_user; команда нужна, чтобы дочистить хвосты вручную
+       и посмотреть прогресс.'''
+    help = 'Удаляет пачками помеченные на удаление рецепты и пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.PURGE_BATCH_SIZE,
+            help='Сколько строк удалять за один DELETE'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for user_id in User.objects.filter(
+            is_deleted=True
+        ).values_list('pk', flat=True).iterator():
+            self.stdout.write(f'Пользователь {user_id}')
+            purge_user(user_id, batch_size, self.report)
+        for recipe_id in Recipe.objects.filter(
+            is_deleted=True
+        ).values_list('pk', flat=True).iterator():
+            self.stdout.write(f'Рецепт {recipe_id}')
+            purge_recipe(recipe_id, batch_size, self.report)
+
+    def report(self, table, deleted):
+        self.stdout.write(f'  {table}: удалено {deleted}')
@@ -1,8 +1,10 @@
 from django.conf import settings
-from django.db import models
+from django.db import connection, models, transaction
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 
 from users.models import User
+from .storage import ContentAddressedStorage
 
 
 class Tag(models.Model):
@@ -33,6 +35,7 @@ class Ingredient(models.Model):
     '''Модэль ингридиента.'''
     name = models.CharField(
         max_length=settings.MAX_LENGTH_255,
+        db_index=True,
         verbose_name='Название ингридиента'
     )
     measurement_unit = models.CharField(
@@ -63,10 +66,13 @@ class Recipe(models.Model):
     )
     title = models.CharField(
         max_length=settings.MAX_LENGTH_255,
+        db_index=True,
         verbose_name='Название рецепта'
     )
     image = models.ImageField(
         upload_to='recipe_images',
+        storage=ContentAddressedStorage(),
+        db_index=True,
         verbose_name='Изображение рецепта'
     )
     description = models.TextField(
@@ -106,11 +112,26 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True
+    )
+    is_deleted = models.BooleanField(
+        default=False,
+        verbose_name='Удалён'
+    )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=['-pub_date'], name='recipe_pub_date'),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date'
+            ),
+        ]
 
     def update_favorites_count(self):
         self.favorites_count = self.favorites.count()
@@ -120,6 +141,11 @@ class Recipe(models.Model):
         self.ingredients_count = self.ingredients.count()
         self.save(update_fields=['ingredients_count'])
 
+    def touch(self):
+        '''Сдвигает updated_at, когда меняются ингредиенты или теги.'''
+        Recipe.objects.filter(pk=self.pk).update(updated_at=timezone.now())
+        Change.log(Change.RECIPE, [self.pk])
+
     def __str__(self):
         return self.title
 
@@ -150,6 +176,13 @@ class RecipeIngredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        indexes = [
+            models.Index(
+                fields=['recipe', 'ingredient'],
+                include=['quantity'],
+                name='recipe_ingredient_quantity'
+            ),
+        ]
 
     def __str__(self):
         return (
@@ -186,6 +219,9 @@ class Favorites(models.Model):
                 name='\n%(app_label)s_%(class)s recipe is favorite\n'
             )
         ]
+        indexes = [
+            models.Index(fields=['user', 'recipe'], name='favorites_user'),
+        ]
 
     def __str__(self) -> str:
         return f"{self.user} -> {self.recipe}"
@@ -196,12 +232,14 @@ class ShoppingList(models.Model):
     recipe = models.ForeignKey(
         verbose_name='Рецепт в списке покупок',
         to=Recipe,
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        related_name='shopping_list'
     )
     user = models.ForeignKey(
         verbose_name='Пользователь списка покупок',
         to=User,
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        related_name='shopping_list'
     )
     date_added = models.DateTimeField(
         verbose_name='Дата добавления',
@@ -219,6 +257,160 @@ class ShoppingList(models.Model):
                 name='\n%(app_label)s_%(class)s recipe is favorite\n'
             )
         ]
+        indexes = [
+            models.Index(fields=['user', 'recipe'], name='shopping_list_user'),
+        ]
 
     def __str__(self) -> str:
         return f"{self.user} -> {self.recipe}"
+
+
+class ChangeQuerySet(models.QuerySet):
+
+    def since(self, kind, token, user_id=None, limit=None):
+        '''Изменения после token: (изменённые id, удалённые id,
+           новый token, есть ли ещё изменения).
+
+           token — пара (номер транзакции, id записи). Записи отдаются в
+           порядке (transaction_id, id) и только из транзакций старше
+           самой старой незавершённой: id выдаются при INSERT, а видны
+           после COMMIT, так что запись долгой транзакции (например,
+           import_recipes) может появиться позже записи с большим id.
+           Транзакции старше xmin снимка уже завершены, и новых строк с
+           такими номерами не будет.'''
+        limit = limit or settings.SYNC_MAX_CHANGES
+        transaction_id, change_id = token
+        changes = self.filter(kind=kind).filter(
+            models.Q(transaction_id__gt=transaction_id)
+            | models.Q(transaction_id=transaction_id, pk__gt=change_id)
+        )
+        horizon = Change.transaction_horizon()
+        if horizon is not None:
+            changes = changes.filter(transaction_id__lt=horizon)
+        if user_id is None:
+            changes = changes.filter(user_id__isnull=True)
+        else:
+            changes = changes.filter(user_id=user_id)
+        rows = list(changes.order_by('transaction_id', 'pk').values_list(
+            'transaction_id', 'pk', 'object_id', 'deleted'
+        )[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        latest = {}
+        for _, _, object_id, deleted in rows:
+            latest.pop(object_id, None)
+            latest[object_id] = deleted
+        changed = [pk for pk, deleted in latest.items() if not deleted]
+        removed = [pk for pk, deleted in latest.items() if deleted]
+        if rows:
+            token = rows[-1][:2]
+        return changed, removed, token, has_more
+
+
+class Change(models.Model):
+    '''Журнал изменений для инкрементальной синхронизации.
+
+       Номер записи служит токеном синхронизации. Для избранного и списка
+       покупок object_id — это id рецепта, а user_id — владелец списка.
+       Удаление рецепта означает и его удаление из всех списков.'''
+    RECIPE = 'recipe'
+    INGREDIENT = 'ingredient'
+    FAVORITE = 'favorite'
+    SHOPPING_LIST = 'shopping_list'
+    KINDS = (
+        (RECIPE, 'Рецепт'),
+        (INGREDIENT, 'Ингредиент'),
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_LIST, 'Список покупок'),
+    )
+
+    kind = models.CharField(
+        max_length=settings.MAX_LENGTH_50,
+        choices=KINDS,
+        verbose_name='Тип объекта'
+    )
+    object_id = models.BigIntegerField(
+        verbose_name='id объекта'
+    )
+    user_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='id пользователя'
+    )
+    deleted = models.BooleanField(
+        default=False,
+        verbose_name='Удалён'
+    )
+    transaction_id = models.BigIntegerField(
+        default=0,
+        verbose_name='Номер транзакции'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата изменения'
+    )
+
+    objects = ChangeQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Журнал изменений'
+        indexes = [
+            models.Index(
+                fields=['kind', 'user_id', 'transaction_id', 'id'],
+                name='change_kind_user'
+            ),
+        ]
+
+    @classmethod
+    def log(cls, kind, object_ids, user_id=None, deleted=False):
+        # В autocommit номер транзакции и INSERT иначе оказались бы в
+        # разных транзакциях, и горизонт в since() мог бы обогнать запись.
+        with transaction.atomic():
+            transaction_id = cls.current_transaction_id()
+            cls.objects.bulk_create(
+                cls(kind=kind, object_id=object_id, user_id=user_id,
+                    deleted=deleted, transaction_id=transaction_id)
+                for object_id in object_ids
+            )
+
+    @staticmethod
+    def current_transaction_id():
+        '''Номер текущей транзакции на PostgreSQL, иначе 0.
+
+           SQLite держит блокировку записи до COMMIT, так что там порядок
+           id и так совпадает с порядком фиксации.'''
+        if connection.vendor != 'postgresql':
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT txid_current()')
+            return cursor.fetchone()[0]
+
+    @staticmethod
+    def transaction_horizon():
+        '''Самая старая незавершённая транзакция (xmin снимка).'''
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT txid_snapshot_xmin(txid_current_snapshot())'
+            )
+            return cursor.fetchone()[0]
+
+    @staticmethod
+    def parse_token(raw):
+        '''Токен вида '<транзакция>.<id>'; '0' — начало журнала.'''
+        parts = [int(part) for part in raw.split('.')]
+        if raw == '0':
+            parts = [0, 0]
+        if len(parts) != 2 or min(parts) < 0:
+            raise ValueError(raw)
+        return tuple(parts)
+
+    @staticmethod
+    def format_token(token):
+        return '.'.join(str(part) for part in token)
+
+    def __str__(self):
+        action = 'удалён' if self.deleted else 'изменён'
+        return f'{self.kind} {self.object_id} {action}'
@@ -0,0 +1,121 @@
+'''Удаление больших объектов пачками.
+
+Обычный delete() загружает через Collector все связанные строки в память
+и удаляет их одной транзакцией. Здесь каждая пачка — отдельный DELETE
+на сыром SQL с LIMIT, поэтому блокировки держатся недолго, а память не
+зависит от объёма данных пользователя. Сигналы при этом не отправляются,
+денормализованные счётчики поправляются вручную.'''
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from users.models import Follow, User
+from .models import (Change, Favorites, Recipe, RecipeIngredient,
+                     ShoppingList)
+
+logger = logging.getLogger(__name__)
+
+
+def quote(name):
+    return connection.ops.quote_name(name)
+
+
+def placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def select_batch(model, column, values, fields, batch_size):
+    sql = (
+        f'SELECT {", ".join(quote(field) for field in fields)} '
+        f'FROM {quote(model._meta.db_table)} '
+        f'WHERE {quote(column)} IN ({placeholders(values)}) LIMIT %s'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*values, batch_size])
+        return cursor.fetchall()
+
+
+def delete_ids(model, ids):
+    sql = (
+        f'DELETE FROM {quote(model._meta.db_table)} '
+        f'WHERE {quote(model._meta.pk.column)} IN ({placeholders(ids)})'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, ids)
+
+
+def delete_batches(model, column, values, batch_size, report,
+                   counter=None):
+    '''Удаляет строки model, где column IN values, пачками.
+
+       counter = (модель, поле FK в model, поле-счётчик) — счётчик,
+       который нужно уменьшить у затронутых строк.'''
+    fields = [model._meta.pk.column]
+    if counter:
+        fields.append(counter[1])
+    deleted = 0
+    while True:
+        rows = select_batch(model, column, values, fields, batch_size)
+        if not rows:
+            return deleted
+        with transaction.atomic():
+            delete_ids(model, [row[0] for row in rows])
+            if counter:
+                decrement(counter[0], counter[2], [row[1] for row in rows])
+        deleted += len(rows)
+        report(model._meta.db_table, deleted)
+
+
+def decrement(model, field, ids):
+    for pk, count in Counter(ids).items():
+        model.objects.filter(pk=pk).update(**{field: F(field) - count})
+
+
+def purge_recipes(ids, batch_size, report):
+    '''Удаляет рецепты ids вместе со всеми связанными строками.'''
+    for model in (RecipeIngredient, Favorites, ShoppingList,
+                  Recipe.tags.through):
+        delete_batches(model, 'recipe_id', ids, batch_size, report)
+    delete_ids(Recipe, ids)
+
+
+def purge_recipe(recipe_id, batch_size=None, report=None):
+    batch_size = batch_size or settings.PURGE_BATCH_SIZE
+    report = report or log_progress
+    purge_recipes([recipe_id], batch_size, report)
+    report(Recipe._meta.db_table, 1)
+
+
+def purge_user(user_id, batch_size=None, report=None):
+    '''Удаляет пользователя и всё, что ему принадлежит, пачками.'''
+    batch_size = batch_size or settings.PURGE_BATCH_SIZE
+    report = report or log_progress
+    purged = 0
+    while True:
+        ids = list(Recipe.objects.filter(
+            author_id=user_id
+        ).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        Change.log(Change.RECIPE, ids, deleted=True)
+        purge_recipes(ids, batch_size, report)
+        purged += len(ids)
+        report(Recipe._meta.db_table, purged)
+    delete_batches(
+        Favorites, 'user_id', [user_id], batch_size, report,
+        counter=(Recipe, 'recipe_id', 'favorites_count')
+    )
+    delete_batches(ShoppingList, 'user_id', [user_id], batch_size, report)
+    # followers_count авторов уменьшен ещё при мягком удалении.
+    delete_batches(Follow, 'user_id', [user_id], batch_size, report)
+    delete_batches(Follow, 'author_id', [user_id], batch_size, report)
+    delete_batches(Change, 'user_id', [user_id], batch_size, report)
+    delete_ids(User, [user_id])
+    report(User._meta.db_table, 1)
+
+
+def log_progress(table, deleted):
+    logger.info('Очистка: %s, удалено %s', table, deleted)
@@ -0,0 +1,118 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.models import change_counter
+from .models import (Change, Favorites, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingList, Tag)
+
+COUNTER_FIELDS = {'favorites_count', 'ingredients_count'}
+
+
+def touch_recipes(recipe_ids):
+    '''Сдвигает updated_at и пишет в журнал пачку рецептов.'''
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        updated_at=timezone.now()
+    )
+    Change.log(Change.RECIPE, recipe_ids)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    # Мягко удалённый рецепт уже вычтен в perform_destroy.
+    if instance.is_deleted:
+        return
+    change_counter(instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    Recipe(pk=instance.recipe_id).touch()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set,
+                        **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        instance.touch()
+    elif pk_set:
+        touch_recipes(pk_set)
+
+
+@receiver(post_save, sender=Tag)
+def tag_changed(sender, instance, created, **kwargs):
+    '''Тег сериализуется внутри рецепта, так что его правка меняет
+       ответы для всех рецептов с этим тегом.'''
+    if not created:
+        touch_recipes(
+            instance.recipe_set.values_list('pk', flat=True).order_by('pk')
+        )
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_changed(sender, instance, created, **kwargs):
+    '''Название и единица ингредиента тоже входят в ответ рецепта.
+       Удаление обрабатывать не нужно: каскад по RecipeIngredient
+       вызывает recipe_ingredients_changed.'''
+    if not created:
+        touch_recipes(
+            RecipeIngredient.objects.filter(
+                ingredient_id=instance.pk
+            ).values_list('recipe_id', flat=True).distinct().order_by(
+                'recipe_id'
+            )
+        )
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    # Связи удаляются каскадом без m2m_changed, рецепты собираем заранее.
+    touch_recipes(
+        instance.recipe_set.values_list('pk', flat=True).order_by('pk')
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_logged(sender, instance, update_fields, **kwargs):
+    if update_fields and set(update_fields) <= COUNTER_FIELDS:
+        return
+    Change.log(Change.RECIPE, [instance.pk], deleted=instance.is_deleted)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_delete_logged(sender, instance, **kwargs):
+    Change.log(Change.RECIPE, [instance.pk], deleted=True)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_logged(sender, instance, **kwargs):
+    Change.log(
+        Change.INGREDIENT, [instance.pk],
+        deleted=kwargs['signal'] is post_delete
+    )
+
+
+@receiver(post_save, sender=Favorites)
+@receiver(post_delete, sender=Favorites)
+@receiver(post_save, sender=ShoppingList)
+@receiver(post_delete, sender=ShoppingList)
+def recipe_list_logged(sender, instance, **kwargs):
+    kind = Change.FAVORITE if sender is Favorites else Change.SHOPPING_LIST
+    Change.log(
+        kind, [instance.recipe_id], user_id=instance.user_id,
+        deleted=kwargs['signal'] is post_delete
+    )
@@ -0,0 +1,35 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    '''Хранилище, где имя файла — sha256 его содержимого.
+
+       Одинаковые картинки от разных пользователей хранятся один раз, а
+       файл по имени никогда не меняется, так что nginx может отдавать
+       его с Cache-Control: immutable. Файлы раскладываются по
+       подкаталогам по первым двум символам хэша. При повторной загрузке
+       у существующего файла обновляется mtime, чтобы gc_media не удалил
+       его в окне между загрузкой и сохранением рецепта.'''
+
+    def save(self, name, content, max_length=None):
+        name = name or content.name
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        name = posixpath.join(
+            posixpath.dirname(name), digest[:2], digest + extension
+        )
+        if self.exists(name):
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
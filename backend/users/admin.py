@@ -1,12 +1,14 @@
 from django.contrib import admin
 
+from foodgram.paginator import EstimatedCountPaginator
 from .models import User
 
 
 class UserAdmin(admin.ModelAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name')
-    search_fields = ('username', 'email')
-    list_filter = ('username', 'email')
+    search_fields = ('username__startswith', 'email__startswith')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(User, UserAdmin)
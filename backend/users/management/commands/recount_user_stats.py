@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Recipe
+from users.models import Follow, User
+
+
+def count_subquery(queryset, field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+                field
+            ).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+class Command(BaseCommand):
+    '''Пересчёт recipes_count и followers_count одним UPDATE.
+
+       Счётчики поддерживаются сигналами; команда нужна для заполнения
+       существующих данных и для сверки. Мягко удалённые рецепты и
+       подписчики не учитываются, как и при обновлении сигналами.'''
+    help = 'Пересчитывает денормализованные счётчики пользователей'
+
+    def handle(self, *args, **options):
+        updated = User.objects.update(
+            recipes_count=count_subquery(
+                Recipe.objects.filter(is_deleted=False), 'author'
+            ),
+            followers_count=count_subquery(
+                Follow.objects.filter(user__is_deleted=False), 'author'
+            ),
+        )
+        self.stdout.write(f'Пересчитано пользователей: {updated}')
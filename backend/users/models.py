@@ -1,9 +1,20 @@
 from django.conf import settings
 from django.db import models
-from django.db.models import F, Q, UniqueConstraint
+from django.db.models import Exists, F, OuterRef, Q, UniqueConstraint, Value
 from django.utils import timezone
 
 
+class UserQuerySet(models.QuerySet):
+
+    def with_is_subscribed(self, user):
+        '''Аннотирует is_subscribed одним подзапросом EXISTS.'''
+        if not user.is_authenticated:
+            return self.annotate(is_subscribed=Value(False))
+        return self.annotate(is_subscribed=Exists(
+            Follow.objects.filter(user_id=user.pk, author=OuterRef('pk'))
+        ))
+
+
 class User(models.Model):
     """ Модель пользователя. """
     USERNAME_FIELD = 'email'
@@ -30,6 +41,22 @@ class User(models.Model):
         default='',
         verbose_name='Пароль'
     )
+    recipes_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов'
+    )
+    followers_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписчиков'
+    )
+    is_deleted = models.BooleanField(
+        default=False,
+        verbose_name='Удалён'
+    )
+
+    objects = UserQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -76,3 +103,8 @@ class Follow(models.Model):
 
     def str(self) -> str:
         return f"{self.user} подписан на {self.author}"
+
+
+def change_counter(user_id, field, delta):
+    '''Атомарно меняет денормализованный счётчик пользователя.'''
+    User.objects.filter(pk=user_id).update(**{field: F(field) + delta})